@@ -80,21 +80,27 @@ ip6_cidr_length = (
 )
 
 
-def __pa_ip(s, loc, toks):
-    return spf.IPNetwork(toks["network"])
+def __pa_ip(s, loc, toks, length=32):
+    address = toks["address"]
+    network = netaddr.IPNetwork(
+        (int(address), toks.get("length", length)), version=address.version
+    )
+    return spf.IPNetwork(network)
 
 
 ip4 = Combine(
     CaselessLiteral("ip4")
     + ":"
-    + Combine(ip4_network + Optional("/" + ip4_cidr_length))("network")
+    + ip4_network("address")
+    + Optional("/" + ip4_cidr_length("length"))
 ).setParseAction(__pa_ip)
 
 ip6 = Combine(
     CaselessLiteral("ip6")
     + ":"
-    + Combine(ip6_network + Optional("/" + ip6_cidr_length))("network")
-).setParseAction(__pa_ip)
+    + ip6_network("address")
+    + Optional("/" + ip6_cidr_length("length"))
+).setParseAction(functools.partial(__pa_ip, length=128))
 
 
 def __pa_all(s, loc, toks):
@@ -1,8 +1,11 @@
 import abc
-import enum
+import functools
 import logging
+import operator
 import re
 
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
 import netaddr
 
 
@@ -27,13 +30,25 @@ __all__ = [
 ]
 
 
+# The object model is read-only by convention: attributes are plain slots for
+# speed, assigned once in __init__, and the cached strings rely on that.
+def _cached_str(method):
+    @functools.wraps(method)
+    def wrapper(self):
+        try:
+            return self._str_cache
+        except AttributeError:
+            self._str_cache = method(self)
+            return self._str_cache
+
+    return wrapper
+
+
 class __Sequence:
-    def __init__(self, data):
-        self.__data = list(data)
+    __slots__ = ("data", "_str_cache")
 
-    @property
-    def data(self):
-        return self.__data
+    def __init__(self, data):
+        self.data = tuple(data)
 
     def __repr__(self):
         return (
@@ -44,6 +59,10 @@ class __Sequence:
 
 
 class SPF(__Sequence):
+    __slots__ = ("_matcher",)
+
+    _matcher: Callable[[Any], Optional[str]]
+
     @property
     def terms(self):
         return self.data
@@ -52,33 +71,73 @@ class SPF(__Sequence):
     def version(self):
         return "spf1"
 
+    @_cached_str
     def __str__(self):
-        result = "v=%s" % self.version
         if self.terms:
-            result += " " + " ".join([str(x) for x in self.terms])
-        return result
-
-
-class Qualifier(str, enum.Enum):
+            return "v=spf1 " + " ".join(map(str, self.terms))
+        return "v=spf1"
+
+    def compile_matcher(self):
+        try:
+            return self._matcher
+        except AttributeError:
+            pass
+
+        # Directives are evaluated in order and the first match wins: ip4/ip6
+        # are decided here, "all" ends the evaluation, and any other mechanism
+        # needs DNS, so addresses reaching it yield None (undecidable).
+        tables: Dict[int, List[Tuple[int, int, str]]] = {4: [], 6: []}
+        default: Optional[str] = None
+        for term in self.terms:
+            if not isinstance(term, Directive):
+                continue
+            mechanism = term.mechanism
+            if isinstance(mechanism, IPNetwork):
+                tables[mechanism.version].append(
+                    (mechanism._mask, mechanism._first, term.qualifier)
+                )
+                continue
+            if isinstance(mechanism, All):
+                default = term.qualifier
+            break
+        else:
+            if not any(isinstance(term, Redirect) for term in self.terms):
+                default = Qualifier.NEUTRAL
+        frozen = {version: tuple(table) for version, table in tables.items()}
+
+        @functools.lru_cache(maxsize=128)
+        def matcher(ip):
+            if not isinstance(ip, netaddr.IPAddress):
+                ip = netaddr.IPAddress(ip)
+            value = int(ip)
+            for mask, first, qualifier in frozen[ip.version]:
+                if value & mask == first:
+                    return qualifier
+            return default
+
+        self._matcher = matcher
+        return matcher
+
+
+class Qualifier:
     PASS = "+"
     FAIL = "-"
     NEUTRAL = "?"
     SOFT_FAIL = "~"
 
+    _VALID = frozenset("+-?~")
 
-class Directive:
-    def __init__(self, mechanism, qualifier=Qualifier.PASS):
-        self.__mechanism = mechanism
-        self.__qualifier = Qualifier(qualifier)
 
-    @property
-    def mechanism(self):
-        return self.__mechanism
+class Directive:
+    __slots__ = ("mechanism", "qualifier", "_str_cache")
 
-    @property
-    def qualifier(self):
-        return self.__qualifier
+    def __init__(self, mechanism, qualifier=Qualifier.PASS):
+        self.mechanism = mechanism
+        if qualifier not in Qualifier._VALID:
+            raise ValueError("%r is not a valid Qualifier" % qualifier)
+        self.qualifier = qualifier
 
+    @_cached_str
     def __str__(self):
         result = self.qualifier if self.qualifier != Qualifier.PASS else ""
         return result + str(self.mechanism)
@@ -91,6 +150,8 @@ class Directive:
 
 
 class Mechanism(abc.ABC):
+    __slots__ = ("_str_cache",)
+
     @abc.abstractmethod
     def __str__(self):
         raise NotImplementedError
@@ -101,6 +162,9 @@ class Mechanism(abc.ABC):
 
 
 class All(Mechanism):
+    __slots__ = ()
+
+    @_cached_str
     def __str__(self):
         return "all"
 
@@ -109,12 +173,10 @@ class All(Mechanism):
 
 
 class __DomainMechanism(Mechanism):
-    def __init__(self, domain):
-        self.__domain = domain
+    __slots__ = ("domain",)
 
-    @property
-    def domain(self):
-        return self.__domain
+    def __init__(self, domain):
+        self.domain = domain
 
     def _str(self):
         return ":%s" % self.domain
@@ -124,32 +186,28 @@ class __DomainMechanism(Mechanism):
 
 
 class Include(__DomainMechanism):
+    __slots__ = ()
+
+    @_cached_str
     def __str__(self):
         return "include" + self._str()
 
 
 class Exists(__DomainMechanism):
+    __slots__ = ()
+
+    @_cached_str
     def __str__(self):
         return "exists" + self._str()
 
 
 class __Cidr(Mechanism):
-    def __init__(self, domain=None, ipv4_prefix_length=32, ipv6_prefix_length=128):
-        self.__domain = domain
-        self.__ipv4_prefix_length = ipv4_prefix_length
-        self.__ipv6_prefix_length = ipv6_prefix_length
-
-    @property
-    def domain(self):
-        return self.__domain
-
-    @property
-    def ipv4_prefix_length(self):
-        return self.__ipv4_prefix_length
+    __slots__ = ("domain", "ipv4_prefix_length", "ipv6_prefix_length")
 
-    @property
-    def ipv6_prefix_length(self):
-        return self.__ipv6_prefix_length
+    def __init__(self, domain=None, ipv4_prefix_length=32, ipv6_prefix_length=128):
+        self.domain = domain
+        self.ipv4_prefix_length = ipv4_prefix_length
+        self.ipv6_prefix_length = ipv6_prefix_length
 
     def _str(self):
         result = ""
@@ -173,39 +231,52 @@ class __Cidr(Mechanism):
 
 
 class A(__Cidr):
+    __slots__ = ()
+
+    @_cached_str
     def __str__(self):
         return "a" + self._str()
 
 
 class MX(__Cidr):
+    __slots__ = ()
+
+    @_cached_str
     def __str__(self):
         return "mx" + self._str()
 
 
 class IPNetwork(Mechanism):
-    def __init__(self, network):
-        self.__network = netaddr.IPNetwork(network)
-
-    @property
-    def network(self):
-        return self.__network.cidr
-
-    @property
-    def version(self):
-        return self.network.version
-
-    @property
-    def address(self):
-        return self.network.ip
-
-    @property
-    def prefix_length(self):
-        return self.network.prefixlen
+    __slots__ = (
+        "network",
+        "version",
+        "address",
+        "prefix_length",
+        "_first",
+        "_mask",
+    )
 
+    def __init__(self, network):
+        if not isinstance(network, netaddr.IPNetwork):
+            network = netaddr.IPNetwork(network)
+        network = network.cidr
+        self.network = network
+        self.version = network.version
+        self.address = network.ip
+        self.prefix_length = network.prefixlen
+        self._first = network.first
+        self._mask = int(network.netmask)
+
+    def __contains__(self, ip):
+        if not isinstance(ip, netaddr.IPAddress):
+            ip = netaddr.IPAddress(ip)
+        return ip.version == self.version and int(ip) & self._mask == self._first
+
+    @_cached_str
     def __str__(self):
         suffix = (
             "/%d" % self.prefix_length
-            if self.prefix_length != self.address.netmask_bits()
+            if self.prefix_length != (32 if self.version == 4 else 128)
             else ""
         )
         return "ip%d:%s%s" % (self.version, self.address, suffix)
@@ -214,8 +285,29 @@ class IPNetwork(Mechanism):
         return "%s(%r)" % (self.__class__.__name__, str(self.network))
 
 
+def _expand_helo(helo):
+    if helo is None:
+        raise ValueError("%{h} macro requires a Query with helo")
+    return helo
+
+
+def _expand_ip(ip):
+    if ip.version == 6:
+        return list("%032x" % int(ip))
+    return str(ip)
+
+
 class Macro:
-    class Type(str, enum.Enum):
+    __slots__ = (
+        "type",
+        "length",
+        "reverse",
+        "delimiter",
+        "_delimiter_re",
+        "_str_cache",
+    )
+
+    class Type:
         SENDER = "s"
         SENDER_LOCAL = "l"
         SENDER_DOMAIN = "o"
@@ -225,30 +317,31 @@ class Macro:
         IP_VERSION = "v"
         HELO = "h"
 
-    def __init__(self, _type, length=None, reverse=False, delimiter="."):
-        self.__type = Macro.Type(_type)
-        self.__length = length
-        self.__reverse = reverse
-        self.__delimiter = delimiter or "."
-
-    @property
-    def type(self):
-        return self.__type
-
-    @property
-    def length(self):
-        return self.__length
+        _VALID = frozenset("slodiphv")
 
-    @property
-    def reverse(self):
-        return self.__reverse
-
-    @property
-    def delimiter(self):
-        return self.__delimiter
+    _expanders: Dict[str, Callable[[Any], Any]] = {
+        Type.SENDER: operator.attrgetter("sender"),
+        Type.SENDER_LOCAL: operator.attrgetter("local_part"),
+        Type.SENDER_DOMAIN: operator.attrgetter("sender_domain"),
+        Type.DOMAIN: operator.attrgetter("domain"),
+        Type.IP: lambda query: _expand_ip(query.ip),
+        Type.IP_DOMAIN: lambda query: "unknown",
+        Type.IP_VERSION: lambda query: "ip6" if query.ip.version == 6 else "in-addr",
+        Type.HELO: lambda query: _expand_helo(query.helo),
+    }
 
+    def __init__(self, _type, length=None, reverse=False, delimiter="."):
+        if _type not in Macro.Type._VALID:
+            raise ValueError("%r is not a valid Macro.Type" % _type)
+        self.type = _type
+        self.length = length
+        self.reverse = reverse
+        self.delimiter = delimiter or "."
+        self._delimiter_re = re.compile("|".join(map(re.escape, self.delimiter)))
+
+    @_cached_str
     def __str__(self):
-        result = self.type.value
+        result = self.type
         if self.length:
             result += "%d" % self.length
         if self.reverse:
@@ -268,66 +361,58 @@ class Macro:
         return "%s(%s%s)" % (self.__class__.__name__, self.type, kwargs)
 
     def expand(self, query):
-        result = None
-        if self.type == Macro.Type.SENDER:
-            result = query.sender
-        elif self.type == Macro.Type.SENDER_LOCAL:
-            result = query.sender.split("@")[0]
-        elif self.type == Macro.Type.SENDER_DOMAIN:
-            result = query.sender.split("@")[1]
-        elif self.type == Macro.Type.DOMAIN:
-            result = query.domain
-        elif self.type == Macro.Type.DOMAIN:
-            result = query.domain
-        elif self.type == Macro.Type.IP:
-            if query.ip.version == 6:
-                result = ".".join(
-                    query.ip.format(netaddr.ipv6_verbose).replace(":", "")
-                )
-            else:
-                result = str(query.ip)
-        elif self.type == Macro.Type.IP_VERSION:
-            if query.ip.version == 6:
-                result = "ip6"
-            else:
-                result = "in-addr"
-        result = re.split("|".join(map(re.escape, self.delimiter)), result)
+        result = self._expanders[self.type](query)
+        if self.delimiter == "." and not self.reverse and not self.length:
+            return result if isinstance(result, str) else ".".join(result)
+        if isinstance(result, str):
+            parts = self._delimiter_re.split(result)
+        elif "." in self.delimiter:
+            parts = result
+        else:
+            parts = [".".join(result)]
         if self.reverse:
-            result.reverse()
-        if self.length:
-            result = result[-self.length :]
-        return ".".join(result)
+            parts = parts[self.length - 1 :: -1] if self.length else parts[::-1]
+        elif self.length:
+            parts = parts[-self.length :]
+        return ".".join(parts)
 
 
 class Domain(__Sequence):
+    __slots__ = ()
+
+    _escape = {"%20": "%-", "%": "%%", " ": "%_"}
+    _escape_re = re.compile("|".join(map(re.escape, _escape)))
+
+    @_cached_str
     def __str__(self):
-        result = ""
+        parts = []
         for i in self.data:
             if isinstance(i, str):
-                result += i.replace("%", "%%").replace("%%20", "%-").replace(" ", "%_")
+                parts.append(self._escape_re.sub(lambda m: self._escape[m.group(0)], i))
             else:
-                result += str(i)
-        return result
+                parts.append(str(i))
+        return "".join(parts)
 
     def expand(self, query):
-        result = ""
+        parts = []
         for i in self.data:
             if isinstance(i, str):
-                result += i
+                parts.append(i)
             else:
-                result += i.expand(query)
-        while len(result) > 253:
-            result = result[result.index(".") + 1 :]
+                parts.append(i.expand(query))
+        result = "".join(parts)
+        if len(result) > 253:
+            cut = result.find(".", len(result) - 254)
+            if cut != -1:
+                result = result[cut + 1 :]
         return result
 
 
 class Modifier(abc.ABC):
-    def __init__(self, domain):
-        self.__domain = domain
+    __slots__ = ("domain", "_str_cache")
 
-    @property
-    def domain(self):
-        return self.__domain
+    def __init__(self, domain):
+        self.domain = domain
 
     @abc.abstractmethod
     def __str__(self):
@@ -341,32 +426,32 @@ class Modifier(abc.ABC):
 
 
 class Redirect(Modifier):
+    __slots__ = ()
+
+    @_cached_str
     def __str__(self):
         return "redirect" + self._str()
 
 
 class Exp(Modifier):
+    __slots__ = ()
+
+    @_cached_str
     def __str__(self):
         return "exp" + self._str()
 
 
-class Query:
-    def __init__(self, sender, domain=None, ip=netaddr.IPAddress("127.0.0.1")):
-        self.__sender = sender
-        self.__domain = domain
-        self.__ip = netaddr.IPAddress(ip)
-
-    @property
-    def sender(self):
-        result = self.__sender
-        if "@" not in result:
-            result = "postmaster@" + result
-        return result
+_LOCALHOST = netaddr.IPAddress("127.0.0.1")
 
-    @property
-    def domain(self):
-        return self.__domain or self.sender.split("@")[1]
 
-    @property
-    def ip(self):
-        return self.__ip
+class Query:
+    __slots__ = ("sender", "local_part", "sender_domain", "domain", "ip", "helo")
+
+    def __init__(self, sender, domain=None, ip=_LOCALHOST, helo=None):
+        if "@" not in sender:
+            sender = "postmaster@" + sender
+        self.sender = sender
+        self.local_part, _, self.sender_domain = sender.rpartition("@")
+        self.domain = domain or self.sender_domain
+        self.ip = ip if isinstance(ip, netaddr.IPAddress) else netaddr.IPAddress(ip)
+        self.helo = helo
@@ -1,4 +1,5 @@
 """Tests for `spf2acl` package."""
+import netaddr
 import pytest
 
 from spf2acl import parser
@@ -17,6 +18,9 @@ from spf2acl.spf import Query
         ("%{d1}", "com"),
         ("%{dr}", "com.example.email"),
         ("%{d2r}", "example.email"),
+        ("%{d1r}", "email"),
+        ("%{d9r}", "com.example.email"),
+        ("%{d9}", "email.example.com"),
         ("%{l}", "strong-bad"),
         ("%{l-}", "strong.bad"),
         ("%{lr}", "strong-bad"),
@@ -89,3 +93,80 @@ def test_domain_ip6(domain, expected):
     q = Query("strong-bad@email.example.com", ip="2001:db8::cb01")
     d = parser.domain.parseString(domain, parseAll=True)[0]
     assert expected == d.expand(q)
+
+
+@pytest.mark.parametrize(
+    ("domain", "expected"),
+    [
+        (".".join(["a" * 63] * 5), ".".join(["a" * 63] * 3)),
+        (
+            "b." + ".".join(["a" * 63] * 3 + ["c" * 61]),
+            ".".join(["a" * 63] * 3 + ["c" * 61]),
+        ),
+        ("%{d}." + ".".join(["a" * 63] * 4), ".".join(["a" * 63] * 3)),
+    ],
+)
+def test_domain_truncate(domain, expected):
+    q = Query("strong-bad@email.example.com")
+    d = parser.domain.parseString(domain, parseAll=True)[0]
+    assert expected == d.expand(q)
+
+
+@pytest.mark.parametrize(
+    ("macro", "expected"),
+    [
+        ("%{i}", "2.0.0.1.0.d.b.8.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.c.b.0.1"),
+        ("%{i4}", "c.b.0.1"),
+        ("%{i2r}", "0.2"),
+        ("%{i3r.-}", "0.0.2"),
+        ("%{ir-}", "2.0.0.1.0.d.b.8.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.c.b.0.1"),
+    ],
+)
+def test_macro_ip6(macro, expected):
+    q = Query("strong-bad@email.example.com", ip="2001:db8::cb01")
+    m = parser.macro.parseString(macro, parseAll=True)[0]
+    assert expected == m.expand(q)
+
+
+@pytest.mark.parametrize(
+    ("macro", "helo", "expected"),
+    [
+        ("%{h}", "mx.example.org", "mx.example.org"),
+        ("%{h2}", "mx.example.org", "example.org"),
+        ("%{p}", "mx.example.org", "unknown"),
+    ],
+)
+def test_macro_helo(macro, helo, expected):
+    q = Query("strong-bad@email.example.com", helo=helo)
+    m = parser.macro.parseString(macro, parseAll=True)[0]
+    assert expected == m.expand(q)
+
+
+def test_macro_helo_missing():
+    q = Query("strong-bad@email.example.com")
+    m = parser.macro.parseString("%{h}", parseAll=True)[0]
+    with pytest.raises(ValueError, match="helo"):
+        m.expand(q)
+
+
+def test_query_ip():
+    ip = netaddr.IPAddress("192.0.2.3")
+    assert Query("strong-bad@email.example.com", ip=ip).ip is ip
+    assert Query("strong-bad@email.example.com", ip="192.0.2.3").ip == ip
+    assert str(Query("strong-bad@email.example.com").ip) == "127.0.0.1"
+
+
+@pytest.mark.parametrize(
+    ("sender", "local_part", "sender_domain"),
+    [
+        ("strong-bad@email.example.com", "strong-bad", "email.example.com"),
+        ("email.example.com", "postmaster", "email.example.com"),
+        ('"strong@bad"@email.example.com', '"strong@bad"', "email.example.com"),
+    ],
+)
+def test_query_sender(sender, local_part, sender_domain):
+    q = Query(sender)
+    assert "%s@%s" % (local_part, sender_domain) == q.sender
+    assert local_part == q.local_part
+    assert sender_domain == q.sender_domain
+    assert sender_domain == q.domain
@@ -1,7 +1,8 @@
 """Tests for `spf2acl` package."""
+import netaddr
 import pytest
 
-from spf2acl import parser
+from spf2acl import parser, spf
 
 
 @pytest.mark.parametrize(
@@ -10,6 +11,11 @@ from spf2acl import parser
         ("v=spf1", "v=spf1"),
         ("v=spf1 ip4:1.2.3.4", "v=spf1 ip4:1.2.3.4"),
         ("v=spf1 ip6:::/64", "v=spf1 ip6:::/64"),
+        ("v=spf1 ip4:0.0.0.0/0", "v=spf1 ip4:0.0.0.0/0"),
+        ("v=spf1 ip4:255.255.255.0/24", "v=spf1 ip4:255.255.255.0/24"),
+        ("v=spf1 ip4:192.0.2.7/24", "v=spf1 ip4:192.0.2.0/24"),
+        ("v=spf1 ip6:::1.2.3.4", "v=spf1 ip6:::1.2.3.4"),
+        ("v=spf1 ip6:::1.2.3.0/120", "v=spf1 ip6:::1.2.3.0/120"),
         ("v=spf1 a//64", "v=spf1 a//64"),
         ("v=spf1 mx:google.de/20", "v=spf1 mx:google.de/20"),
         ("v=spf1 include:google.de", "v=spf1 include:google.de"),
@@ -64,3 +70,146 @@ def test_parser_rfc(record, expected):
 def test_parser_equal(record):
     result = parser.record.parseString(record, parseAll=True)
     assert record == str(result[0])
+
+
+@pytest.mark.parametrize(
+    ("domain"),
+    [
+        ("%{l}%-x%_%%20.%%_spf.%{d}"),
+        ("foo%_bar%%%-.example.com"),
+    ],
+)
+def test_domain_escape(domain):
+    result = parser.domain.parseString(domain, parseAll=True)
+    assert domain == str(result[0])
+
+
+@pytest.mark.parametrize(
+    ("record", "expected"),
+    [
+        ("v=spf1", "SPF([])"),
+        (
+            "v=spf1 ip4:192.0.2.0/24 all",
+            "SPF([Directive(IPNetwork('192.0.2.0/24')), Directive(All())])",
+        ),
+        (
+            "v=spf1 a:example.com/24 include:example.org",
+            "SPF([Directive(A(domain = Domain(['example.com']), "
+            "ipv4_prefix_length = 24)), "
+            "Directive(Include(Domain(['example.org'])))])",
+        ),
+        ("v=spf1 exp=example.net", "SPF([Exp(Domain(['example.net']))])"),
+        (
+            "v=spf1 ~all",
+            "SPF([Directive(All(), qualifier = ~)])",
+        ),
+        (
+            "v=spf1 redirect=%{d2r}",
+            "SPF([Redirect(Domain([Macro(d, length = 2, reverse = True)]))])",
+        ),
+    ],
+)
+def test_parser_repr(record, expected):
+    result = parser.record.parseString(record, parseAll=True)
+    assert expected == repr(result[0])
+
+
+def test_str_cached():
+    result = parser.record.parseString(
+        "v=spf1 ip4:192.0.2.0/24 a:%{d2}/24 -all", parseAll=True
+    )[0]
+    assert str(result) is str(result)
+    assert str(result.terms[1].mechanism) is str(result.terms[1].mechanism)
+
+
+def test_str_cache_not_stale():
+    record = "v=spf1 ip4:192.0.2.0/24 a:%{d2}/24 -all"
+    result = parser.record.parseString(record, parseAll=True)[0]
+    directive = result.terms[2]
+    macro = result.terms[1].mechanism.domain.data[0]
+    assert record == str(result)
+    assert "-all" == str(directive)
+    assert "%{d2}" == str(macro)
+    with pytest.raises(AttributeError):
+        result.terms.append(directive)
+    assert record == str(result)
+    assert "-all" == str(directive)
+    assert "%{d2}" == str(macro)
+    assert repr(parser.record.parseString(record, parseAll=True)[0]) == repr(result)
+
+
+@pytest.mark.parametrize(
+    ("mechanism", "ip", "expected"),
+    [
+        ("ip4:192.0.2.0/24", "192.0.2.1", True),
+        ("ip4:192.0.2.0/24", "192.0.3.1", False),
+        ("ip4:192.0.2.1", "192.0.2.1", True),
+        ("ip4:0.0.0.0/0", "203.0.113.7", True),
+        ("ip4:192.0.2.0/24", "::ffff:192.0.2.1", False),
+        ("ip6:2001:1234::/32", "2001:1234::cb01", True),
+        ("ip6:2001:1234::/32", "2001:1235::cb01", False),
+        ("ip6:::/0", "192.0.2.1", False),
+    ],
+)
+def test_ip_contains(mechanism, ip, expected):
+    result = parser.directive.parseString(mechanism, parseAll=True)[0]
+    assert expected == (ip in result.mechanism)
+
+
+@pytest.mark.parametrize(
+    ("record", "ip", "expected"),
+    [
+        ("v=spf1 -ip4:192.0.2.1 ip4:192.0.2.0/24 mx -all", "192.0.2.1", "-"),
+        ("v=spf1 -ip4:192.0.2.1 ip4:192.0.2.0/24 mx -all", "192.0.2.2", "+"),
+        ("v=spf1 -ip4:192.0.2.1 ip4:192.0.2.0/24 mx -all", "192.0.3.1", None),
+        ("v=spf1 ~ip6:2001:1234::/32 ip4:192.0.2.0/24 -all", "2001:1234::1", "~"),
+        ("v=spf1 ~ip6:2001:1234::/32 ip4:192.0.2.0/24 -all", "2001:1235::1", "-"),
+        ("v=spf1 ~ip6:2001:1234::/32 ip4:192.0.2.0/24 -all", "192.0.2.1", "+"),
+        ("v=spf1 -all ip4:192.0.2.0/24", "192.0.2.1", "-"),
+        ("v=spf1 -a ip4:192.0.2.0/24", "192.0.2.1", None),
+        ("v=spf1 include:example.org ip4:192.0.2.0/24", "192.0.2.1", None),
+        ("v=spf1 ip4:192.0.2.0/24 -all", "192.0.3.1", "-"),
+        ("v=spf1 ip4:192.0.2.0/24", "192.0.3.1", "?"),
+        ("v=spf1 ip4:192.0.2.0/24 redirect=example.org", "192.0.2.1", "+"),
+        ("v=spf1 ip4:192.0.2.0/24 redirect=example.org", "192.0.3.1", None),
+        ("v=spf1 redirect=example.org ip4:192.0.2.0/24 ~all", "192.0.3.1", "~"),
+        ("v=spf1 ip4:192.0.2.0/24 exp=example.org", "192.0.3.1", "?"),
+    ],
+)
+def test_compile_matcher(record, ip, expected):
+    result = parser.record.parseString(record, parseAll=True)[0]
+    matcher = result.compile_matcher()
+    assert matcher is result.compile_matcher()
+    assert expected == matcher(ip)
+
+
+@pytest.mark.parametrize(
+    ("cls", "args"),
+    [
+        (spf.Directive, (spf.All(), "!")),
+        (spf.Macro, ("x",)),
+    ],
+)
+def test_invalid_value(cls, args):
+    with pytest.raises(ValueError, match="is not a valid"):
+        cls(*args)
+
+
+@pytest.mark.parametrize(
+    ("obj"),
+    [
+        (spf.SPF([spf.Directive(spf.All())])),
+        (spf.Domain(["example.com"])),
+    ],
+)
+def test_sequence_immutable(obj):
+    assert isinstance(obj.data, tuple)
+    with pytest.raises(TypeError):
+        obj.data[0] = None
+
+
+def test_ip_network_types():
+    result = parser.directive.parseString("ip6:::1.2.3.4/120", parseAll=True)[0]
+    assert isinstance(result.mechanism.network, netaddr.IPNetwork)
+    assert isinstance(result.mechanism.address, netaddr.IPAddress)
+    assert netaddr.IPNetwork("::1.2.3.0/120") == result.mechanism.network